@@ -1,4 +1,5 @@
 import json
+import os
 import random
 from datetime import datetime
 import math # 対数計算のためにmathをインポート
@@ -7,20 +8,27 @@ from flask import Flask, jsonify, request, render_template, redirect, url_for
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from sqlalchemy import case, func, inspect, text, update
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from cache import create_cache
+from config import load_config
+from opponents import OpponentPreparer, roster_version
+from win_expectancy import final_win_probability, inning_and_half, load_default as load_win_expectancy, situation_index
+
 # --- Flask & SQLAlchemy 初期設定 ---
 app = Flask(__name__, static_folder='static', template_folder='templates')
 CORS(app, supports_credentials=True)
 
-# セキュリティのためのシークレットキー設定（本番環境では安全なキーを使用）
-app.config['SECRET_KEY'] = 'a_very_secret_key_for_session_management_baseball'
-
-# SQLite データベース設定
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 実行モード（BASEBALL_ENV）に応じてシークレットキー・DB・キャッシュを設定
+# 本番環境ではシークレットキーとDBのURLを環境変数で指定する（config.py 参照）
+app.config.update(load_config())
 db = SQLAlchemy(app)
 
+# ログインユーザーとセーブデータのキャッシュ（デフォルトはプロセス内LRU、CACHE_URLでRedis互換サーバーを共有）
+cache = create_cache(app.config['CACHE_URL'], maxsize=app.config['CACHE_MAXSIZE'], default_ttl=app.config['CACHE_TTL'])
+
 # Flask-Login の設定
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -33,17 +41,40 @@ def unauthorized():
     # フロントエンドのJavaScriptがこの401を検出してログイン画面に遷移させます。
     return jsonify({"error": "Unauthorized Access"}), 401
 
+class SessionUser(UserMixin):
+    """キャッシュから復元したログインユーザー（リクエストごとのDB問い合わせを避ける）"""
+    def __init__(self, id, username):
+        self.id = id
+        self.username = username
+
+def user_cache_key(user_id):
+    return f"user:{user_id}"
+
+def user_state_cache_key(user_id):
+    return f"user_state:{user_id}"
+
+def opponents_cache_key(user_id, version):
+    return f"opponents:{user_id}:{version}"
+
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    record = cache.get(user_cache_key(user_id))
+    if record is None:
+        user = db.session.get(User, int(user_id))
+        if user is None:
+            return None
+        record = {"id": user.id, "username": user.username}
+        cache.set(user_cache_key(user_id), record)
+    return SessionUser(record['id'], record['username'])
 
 # --- ゲームロジックのためのクラス定義 ---
 
 class Team:
     """試合進行で使用するチーム情報"""
-    def __init__(self, team_name, players, order_ids):
+    def __init__(self, team_name, players, order_ids, players_map=None):
         self.name = team_name
-        self.players_map = {p['id']: p for p in players} # 選手IDで引ける辞書
+        # 選手IDで引ける辞書（事前に作成済みのものを渡された場合は作り直さない）
+        self.players_map = players_map if players_map is not None else {p['id']: p for p in players}
         self.batting_order = [self.players_map[pid] for pid in order_ids['batters']]
         self.pitcher = self.players_map[order_ids['pitcher']]
         self.batter_index = 0 # 現在の打者インデックス
@@ -65,6 +96,7 @@ class GameState:
         self.half = "top" # "top" or "bottom"
         self.outs = 0
         self.bases = [None, None, None] # [1B, 2B, 3B] 走者がいればplayer_id, なければNone
+        self.base_state = 0 # 走者状況のビット (1塁=1, 2塁=2, 3塁=4)。勝利確率テーブルの添字用に走者の移動と一緒に更新する
         self.score = { team_a.name: 0, team_b.name: 0 }
         self.team_at_bat = team_a
         self.team_in_field = team_b
@@ -79,6 +111,7 @@ class GameState:
         """イニング表裏を交代し、攻守を入れ替える"""
         self.outs = 0
         self.bases = [None, None, None]
+        self.base_state = 0
         self.team_at_bat, self.team_in_field = self.team_in_field, self.team_at_bat
         
         if self.half == "bottom":
@@ -96,9 +129,24 @@ class GameState:
 class GameEngine:
     """打席結果を計算し、試合を進行するエンジン"""
     
-    def __init__(self, game_state):
+    def __init__(self, game_state, win_expectancy=None):
         self.state = game_state
         self.log = []
+        # 勝利確率テーブル（指定時のみ打席ごとに勝利確率とレバレッジを記録する）
+        self.win_expectancy = win_expectancy
+        # 打席ごとの記録を行うか。行わない場合は走者状況のビットも状況の添字も計算しない
+        self.record_plays = win_expectancy is not None
+        # (打席前の添字, 打席後の添字, 結果, 得点, 打者ID, ログの位置) のタプル。辞書への変換は応答時に行う
+        self.plays = []
+        # 勝利確率は先攻チーム（最初の攻撃側）から見た値
+        self.first_team = game_state.team_at_bat
+        self.second_team = game_state.team_in_field
+        self.first_team_name = self.first_team.name
+        self.second_team_name = self.second_team.name
+        # 次の打席前の状況の添字（盗塁判定を含めた打席全体の勝利確率の変化を記録するため、盗塁前の状況を使う）。
+        # 打席後からチェンジまでに状況は変わらず、チェンジ後の状況は current_situation が求めるので、
+        # 直前の打席の「打席後」の添字をそのまま次の打席の「打席前」として使える
+        self.situation = self.current_situation() if self.record_plays else None
 
     def run_game(self):
         """9イニングまで試合を進行させる"""
@@ -172,9 +220,90 @@ class GameEngine:
             
             # スコア更新
             self.state.score[self.state.team_at_bat.name] += runs
+            
+            if self.record_plays:
+                self.record_play(batter, result_type, runs)
         
         self.state.switch_half()
 
+    def score_diff(self):
+        """先攻 − 後攻 の得点差"""
+        return self.state.score[self.first_team_name] - self.state.score[self.second_team_name]
+
+    def current_situation(self):
+        """現在の試合状況の勝利確率テーブル上の添字。試合が終了していれば None"""
+        state = self.state
+        half = 1 if state.half == 'bottom' else 0
+        if state.outs >= 3:
+            # 3アウト後はチェンジ後の状況（無死走者なし）で評価する
+            inning = state.inning + half
+            if inning > 9:
+                return None
+            return situation_index(inning, 1 - half, 0, 0, self.score_diff())
+        return situation_index(state.inning, half, state.outs, state.base_state, self.score_diff())
+
+    def record_play(self, batter, result_type, runs):
+        """打席結果を打席前後の状況の添字と一緒に記録する（勝利確率は応答を作るときに引く）"""
+        situation_after = self.current_situation()
+        self.plays.append((self.situation, situation_after, result_type, runs, batter['id'], len(self.log) - 1))
+        self.situation = situation_after
+
+    def play_win_probabilities(self, play):
+        """打席前後の勝利確率"""
+        situation_before, situation_after = play[0], play[1]
+        wp_before = self.win_expectancy.win_probability(situation_before)
+        if situation_after is None:
+            # 添字がないのは試合終了時だけなので、最終スコアで決まる
+            return wp_before, final_win_probability(self.score_diff())
+        return wp_before, self.win_expectancy.win_probability(situation_after)
+
+    def play_details(self, indices=None):
+        """打席ごとの勝利確率とレバレッジを応答用の辞書にする（indices を省略した場合は全打席）"""
+        players_map = {**self.second_team.players_map, **self.first_team.players_map}
+        # 表は後攻チーム、裏は先攻チームが守備につく
+        pitcher_names = (self.second_team.get_pitcher()['name'], self.first_team.get_pitcher()['name'])
+        probabilities = self._win_probabilities()
+        details = []
+        for i in range(len(self.plays)) if indices is None else indices:
+            situation_before, _, result_type, runs, batter_id, log_index = self.plays[i]
+            inning, half = inning_and_half(situation_before)
+            wp_before, wp_after = probabilities[i], probabilities[i + 1]
+            details.append({
+                "inning": inning,
+                "half": 'bottom' if half else 'top',
+                "batter": players_map[batter_id]['name'],
+                "pitcher": pitcher_names[half],
+                "result": result_type,
+                "runs": runs,
+                "description": self.log[log_index],
+                "wp_before": round(wp_before, 4),
+                "wp_after": round(wp_after, 4),
+                "wpa": round(wp_after - wp_before, 4),
+                "leverage": round(self.win_expectancy.leverage(situation_before), 2),
+            })
+        return details
+
+    def _win_probabilities(self):
+        """試合開始時と各打席終了時点の勝利確率（打席の前後の添字はつながっている）"""
+        if not self.plays:
+            return []
+        win_probability = self.win_expectancy.win_probability
+        probabilities = [win_probability(self.plays[0][0])]
+        for play in self.plays:
+            probabilities.append(final_win_probability(self.score_diff()) if play[1] is None
+                                 else win_probability(play[1]))
+        return probabilities
+
+    def win_probability_series(self):
+        """試合開始から各打席終了時点までの勝利確率の推移（グラフ表示用）"""
+        return [round(wp, 4) for wp in self._win_probabilities()]
+
+    def key_plays(self, count=5):
+        """勝利確率を大きく動かした打席（絶対値の大きい順）"""
+        probabilities = self._win_probabilities()
+        indices = sorted(range(len(self.plays)), key=lambda i: abs(probabilities[i + 1] - probabilities[i]), reverse=True)
+        return self.play_details(indices[:count])
+
     def attempt_steals(self):
         """盗塁の試行と結果を判定する (簡易ロジック)"""
         # 盗塁は一塁走者のみ試行すると仮定 (bases[0]が1塁走者)
@@ -204,6 +333,7 @@ class GameEngine:
                 # 成功: 走者を2塁へ進める
                 self.state.bases[0] = None
                 self.state.bases[1] = runner_id
+                self.state.base_state = self.state.base_state & ~1 | 2
                 
                 self.log.append(f"[HOMERUN/STEAL DEBUG] STOLEN BASE SUCCESS! Runner: {runner['name']}")
 
@@ -213,6 +343,7 @@ class GameEngine:
                 # 失敗: アウト追加
                 self.state.outs += 1
                 self.state.bases[0] = None # 走者をアウトにする
+                self.state.base_state &= ~1
                 self.log.append(f"CAUGHT STEALING: {runner['name']} caught stealing. ({self.state.outs}アウト)")
 
     def play_at_bat(self, batter, pitcher):
@@ -306,13 +437,18 @@ class GameEngine:
                 new_bases[bases_hit - 1] = batter_id
         
         self.state.bases = new_bases
+        if self.record_plays:
+            self.state.base_state = (
+                (new_bases[0] is not None) | (new_bases[1] is not None) << 1 | (new_bases[2] is not None) << 2)
         return runs
 
 def update_stats_after_game(teams_data, user_team_name, game_result):
     """
     試合結果に基づいて、ユーザーチームの成績を更新する
     """
-    teams_data = json.loads(json.dumps(teams_data)) # 変更可能なコピーを作成
+    # 変更可能なコピーを作成 (成績が変わるのはユーザーチームだけなので、他チームは共有する)
+    teams_data = dict(teams_data)
+    teams_data[user_team_name] = json.loads(json.dumps(teams_data[user_team_name]))
     user_team_players = teams_data[user_team_name]
     
     # 統計集計マップを生成
@@ -544,7 +680,7 @@ def generate_initial_teams_data():
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256)) # scryptのハッシュは160文字程度（SQLite以外のDBでは長さが検査される）
     
     # ユーザーの状態（ゲームデータ）と1対1で関連付け
     user_state = db.relationship('UserState', backref='manager', uselist=False, lazy=True)
@@ -565,6 +701,9 @@ class UserState(db.Model):
     schedule_json = db.Column(db.Text, nullable=False) # 試合履歴のリスト
     current_order_json = db.Column(db.Text, nullable=False) # 現在のオーダー（選手IDリスト）
     
+    # 書き込みごとに1増やす。古いデータを元にした書き込みで他ワーカーの結果を上書きしないために使う
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # 初期データを生成するクラスメソッド
     @classmethod
     def create_initial_state(cls, user_id):
@@ -578,21 +717,150 @@ class UserState(db.Model):
             current_order_json=json.dumps(initial_order)
         )
 
+# --- セーブデータの読み書き（キャッシュ経由） ---
+
+USER_TEAM_NAME = "自チーム (blue)"
+
+# セーブデータごとの相手チーム・日程の事前計算結果（プロセス内LRU）
+opponent_preparer = OpponentPreparer()
+
+# 勝利確率・レバレッジのテーブル（起動時に一度だけ読み込む。未生成なら勝利確率は記録しない）
+win_expectancy = load_win_expectancy()
+
+# 他のワーカーと書き込みが競合した場合に、DBから読み直してやり直す回数
+SAVE_RETRIES = 3
+
+def load_user_state(user_id, create=False, refresh=False):
+    """
+    ユーザーのセーブデータのうち、試合ごとに必要な部分を辞書で返す。
+        user_team      : ユーザーチームの選手リスト
+        current_order  : 現在のオーダー
+        games_played   : 消化試合数（日程の何試合目か）
+        roster_version : 相手チームのデータを引くためのキー（相手チームは試合で変化しない）
+        version        : DB行のバージョン（書き込み時の競合検出用）
+    相手チームと試合履歴はこの辞書に含めず、必要なときだけ読み込む（get_league, load_schedule）。
+    キャッシュにあればDBに問い合わせない（refresh=True なら必ずDBから読む）。
+    キャッシュ上の値は共有されるため変更しないこと。
+    DBから読んだ値はキャッシュにキーがない場合だけ保存する。読み込みと保存の間に他のワーカーが
+    save_user_state で新しいバージョンをキャッシュした場合に、古い値で上書きしないため。
+    """
+    if not refresh:
+        state = cache.get(user_state_cache_key(user_id))
+        if state is not None:
+            return state
+
+    user_state = UserState.query.filter_by(user_id=user_id).first()
+    if user_state is None:
+        if not create:
+            return None
+        user_state = UserState.create_initial_state(user_id)
+        db.session.add(user_state)
+        db.session.commit()
+
+    teams = json.loads(user_state.teams_json)
+    version = roster_version(teams, USER_TEAM_NAME)
+    opponent_teams = {name: players for name, players in teams.items() if name != USER_TEAM_NAME}
+    cache.set(opponents_cache_key(user_id, version), opponent_teams)
+
+    state = {
+        "user_team": teams[USER_TEAM_NAME],
+        "current_order": json.loads(user_state.current_order_json),
+        "games_played": len(json.loads(user_state.schedule_json)),
+        "roster_version": version,
+        "version": user_state.version,
+    }
+    cache.add(user_state_cache_key(user_id), state)
+    return state
+
+def load_schedule(user_id):
+    """試合履歴をDBから読み込む（試合のたびに増えるためキャッシュしない）"""
+    schedule_json = db.session.execute(
+        db.select(UserState.schedule_json).where(UserState.user_id == user_id)).scalar()
+    return json.loads(schedule_json) if schedule_json is not None else []
+
+def save_user_state(user_id, state, columns, **changes):
+    """
+    columns（列名 -> 値またはSQL式）をDBに書き込み、キャッシュ上のセーブデータに changes を反映する。
+    state を読み込んだ後に他のワーカーが書き込んでいた場合は何も書かずに False を返す。
+    """
+    key = user_state_cache_key(user_id)
+    # 書き込み中・書き込み失敗時に古い値が読まれないよう、先にキャッシュから消しておく
+    cache.delete(key)
+
+    result = db.session.execute(
+        update(UserState)
+        .where(UserState.user_id == user_id, UserState.version == state['version'])
+        .values(version=state['version'] + 1, **columns)
+    )
+    db.session.commit()
+    if result.rowcount == 0:
+        return False
+
+    cache.set(key, {**state, **changes, "version": state['version'] + 1})
+    return True
+
+def get_league(user_id, state):
+    """セーブデータに対応する相手チーム群と日程を返す（プロセス内にない場合だけ共有キャッシュ・DBから読む）"""
+    version = state['roster_version']
+
+    def load_opponent_teams():
+        opponent_teams = cache.get(opponents_cache_key(user_id, version))
+        if opponent_teams is None:
+            teams_json = db.session.execute(
+                db.select(UserState.teams_json).where(UserState.user_id == user_id)).scalar()
+            teams = json.loads(teams_json)
+            opponent_teams = {name: players for name, players in teams.items() if name != USER_TEAM_NAME}
+            cache.set(opponents_cache_key(user_id, version), opponent_teams)
+        return opponent_teams
+
+    return opponent_preparer.get(user_id, version, load_opponent_teams)
+
+def encode_teams(user_team, league):
+    """teams_json を組み立てる（相手チーム部分はエンコード済みの文字列を使う）"""
+    user_part = f"{json.dumps(USER_TEAM_NAME)}: {json.dumps(user_team)}"
+    if not league.opponents_json:
+        return "{" + user_part + "}"
+    return "{" + user_part + ", " + league.opponents_json + "}"
+
+def append_to_schedule(entry):
+    """schedule_json の末尾に1試合分を追加するSQL式（既存の履歴を読み込まずにDB側で連結する）"""
+    entry_json = json.dumps(entry)
+    column = UserState.schedule_json
+    return case(
+        (column == '[]', '[' + entry_json + ']'),
+        else_=func.substr(column, 1, func.length(column) - 1).concat(', ' + entry_json + ']'),
+    )
+
+def ensure_user_state_version_column():
+    """version 列がない既存DB（instance/users.db など）に列を追加する"""
+    columns = [column['name'] for column in inspect(db.engine).get_columns('user_state')]
+    if 'version' not in columns:
+        db.session.execute(text("ALTER TABLE user_state ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+        db.session.commit()
+
 # --- データベースの初期化 ---
 with app.app_context():
     db.create_all()
+    ensure_user_state_version_column()
 
     # デバッグ用の初期ユーザーを作成
     if not User.query.filter_by(username='testuser').first():
-        test_user = User(username='testuser')
-        test_user.set_password('password')
-        db.session.add(test_user)
-        db.session.commit()
-        # ユーザー状態も初期化
-        initial_state = UserState.create_initial_state(test_user.id)
-        db.session.add(initial_state)
-        db.session.commit()
-        print("Initial user 'testuser' created.")
+        try:
+            test_user = User(username='testuser')
+            test_user.set_password('password')
+            db.session.add(test_user)
+            db.session.commit()
+            # ユーザー状態も初期化
+            initial_state = UserState.create_initial_state(test_user.id)
+            db.session.add(initial_state)
+            db.session.commit()
+            print("Initial user 'testuser' created.")
+        except IntegrityError:
+            # 複数ワーカーが同時に起動した場合、他のワーカーが作成済み
+            db.session.rollback()
+
+    # fork型のワーカー（gunicorn --preload など）で親プロセスの接続を引き継がないようにする
+    db.engine.dispose()
 
 # --- ルーティング ---
 
@@ -630,17 +898,15 @@ def logout():
 @login_required
 def get_game_state():
     # ユーザーのゲーム状態を取得。存在しない場合は自動的に初期化される
-    user_state = current_user.user_state
-    if user_state is None:
-        user_state = UserState.create_initial_state(current_user.id)
-        db.session.add(user_state)
-        db.session.commit()
+    state = load_user_state(current_user.id, create=True)
+    league = get_league(current_user.id, state)
 
-    # DBからJSONデータをロードして結合し、フロントエンドに返す
+    # キャッシュまたはDBからロードしたデータをフロントエンドに返す
     return jsonify({
-        "teams": json.loads(user_state.teams_json),
-        "schedule": json.loads(user_state.schedule_json),
-        "current_order": json.loads(user_state.current_order_json),
+        "teams": {USER_TEAM_NAME: state['user_team'], **league.opponent_teams},
+        "schedule": load_schedule(current_user.id),
+        "current_order": state['current_order'],
+        "upcoming": league.upcoming(state['games_played']),
     }), 200
 
 
@@ -650,81 +916,88 @@ def get_game_state():
 def receive_order():
     order_data = request.json
     
-    user_state = current_user.user_state
-    if user_state is None:
-        return jsonify({"error": "User state not initialized"}), 500
+    for attempt in range(SAVE_RETRIES):
+        state = load_user_state(current_user.id, refresh=attempt > 0)
+        if state is None:
+            return jsonify({"error": "User state not initialized"}), 500
 
-    # current_order_jsonを更新
-    user_state.current_order_json = json.dumps(order_data)
-    db.session.commit()
+        # current_order_jsonを更新
+        if save_user_state(current_user.id, state, {"current_order_json": json.dumps(order_data)},
+                           current_order=order_data):
+            return jsonify({"message": "Order saved successfully!"}), 200
 
-    return jsonify({"message": "Order saved successfully!"}), 200
+    return jsonify({"error": "Save data was updated concurrently. Please retry."}), 409
 
 
 # ランダムな試合結果を生成し、DBに保存するエンドポイント（認証必須）
 @app.route('/api/simulate_game', methods=['GET'])
 @login_required
 def simulate_game():
-    user_state = current_user.user_state
-    if user_state is None:
-        return jsonify({"error": "User state not initialized"}), 500
-
-    # 1. 試合の準備
-    teams_data = json.loads(user_state.teams_json)
-    user_order = json.loads(user_state.current_order_json)
-    user_team_name = "自チーム (blue)"
-    
-    # オーダーが空の場合はシミュレーションを中止
-    if not user_order['batters'] or user_order['pitcher'] is None:
-        # ランダムな試合結果を返さず、警告を返す
-        return jsonify({"message": "オーダーが設定されていません。先にオーダーを決定してください。", "warning": True}), 200
-
-    # 対戦相手のランダム選択
-    opponent_teams_names = [t for t in teams_data.keys() if t != user_team_name]
-    opponent_team_name = random.choice(opponent_teams_names)
-    
-    # 相手チームのオーダーを自動生成 (ランダムな打順と先発投手)
-    opponent_players = teams_data[opponent_team_name]
-    opponent_batters = [p for p in opponent_players if not p['is_pitcher']]
-    opponent_pitchers = [p for p in opponent_players if p['is_pitcher']]
-    
-    random.shuffle(opponent_batters)
-    opponent_pitcher = random.choice(opponent_pitchers) if opponent_pitchers else None
-
-    opponent_order = {
-        "batters": [p['id'] for p in opponent_batters[:9]],
-        "pitcher": opponent_pitcher['id'] if opponent_pitcher else None
-    }
-    
-    # 2. Teamオブジェクトの作成
-    user_team = Team(user_team_name, teams_data[user_team_name], user_order)
-    opponent_team = Team(opponent_team_name, teams_data[opponent_team_name], opponent_order)
-    
-    # 3. 試合の実行
-    engine = GameEngine(GameState(user_team, opponent_team))
-    game_result_data = engine.run_game()
-    
-    # 4. 成績データの更新 (簡易的な更新ロジックを呼び出し)
-    updated_teams_data = update_stats_after_game(teams_data, user_team_name, game_result_data)
-    
-    # 5. DBに保存
-    schedule = json.loads(user_state.schedule_json)
-    schedule.append({
-        "home_team": game_result_data['home_team'],
-        "away_team": game_result_data['away_team'],
-        "home_score": game_result_data['home_score'],
-        "away_score": game_result_data['away_score'],
-        "result": game_result_data['result'],
-        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "log": engine.log # 試合ログを保存（デバッグ用）
-    })
-    
-    user_state.schedule_json = json.dumps(schedule)
-    user_state.teams_json = json.dumps(updated_teams_data) # 更新された選手データを保存
-    db.session.commit()
+    # 他のワーカーと書き込みが競合した場合は、最新のセーブデータで試合をやり直す
+    for attempt in range(SAVE_RETRIES):
+        state = load_user_state(current_user.id, refresh=attempt > 0)
+        if state is None:
+            return jsonify({"error": "User state not initialized"}), 500
+
+        # 1. 試合の準備
+        user_order = state['current_order']
+        user_team_name = USER_TEAM_NAME
+        
+        # オーダーが空の場合はシミュレーションを中止
+        if not user_order['batters'] or user_order['pitcher'] is None:
+            # ランダムな試合結果を返さず、警告を返す
+            return jsonify({"message": "オーダーが設定されていません。先にオーダーを決定してください。", "warning": True}), 200
+
+        # 日程に従って対戦相手と先発投手を決定 (打者プール・ローテーションは事前計算済み)
+        league = get_league(current_user.id, state)
+        matchup = league.matchup(state['games_played'])
+        
+        # 2. Teamオブジェクトの作成 (使うのはユーザーチームと対戦相手の2チームだけ)
+        user_team = Team(user_team_name, state['user_team'], user_order)
+        opponent = matchup.opponent
+        opponent_team = Team(opponent.name, opponent.players_map.values(), matchup.order(), players_map=opponent.players_map)
+        
+        # 3. 試合の実行
+        engine = GameEngine(GameState(user_team, opponent_team), win_expectancy)
+        game_result_data = engine.run_game()
+        
+        # 4. 成績データの更新 (簡易的な更新ロジックを呼び出し)
+        updated_user_team = update_stats_after_game(
+            {user_team_name: state['user_team']}, user_team_name, game_result_data)[user_team_name]
+        
+        # 5. DBに保存
+        game_record = {
+            "home_team": game_result_data['home_team'],
+            "away_team": game_result_data['away_team'],
+            "home_score": game_result_data['home_score'],
+            "away_score": game_result_data['away_score'],
+            "result": game_result_data['result'],
+            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "log": engine.log, # 試合ログを保存（デバッグ用）
+            "win_probability": engine.win_probability_series(), # 自チーム（先攻）の勝利確率の推移
+            "key_plays": engine.key_plays(), # 勝負所となった打席
+        }
+        
+        # 試合履歴への追加と更新された選手データを保存
+        columns = {
+            "teams_json": encode_teams(updated_user_team, league),
+            "schedule_json": append_to_schedule(game_record),
+        }
+        if save_user_state(current_user.id, state, columns,
+                           user_team=updated_user_team, games_played=state['games_played'] + 1):
+            response = {"message": "Game simulated and state saved.", "log": engine.log}
+            # 全打席の勝利確率は画面では使わないため、?details=1 を指定された場合だけ返す
+            if request.args.get('details') == '1':
+                response["plays"] = engine.play_details()
+            return jsonify(response), 200
 
-    return jsonify({"message": "Game simulated and state saved.", "log": engine.log}), 200
+    return jsonify({"error": "Save data was updated concurrently. Please retry."}), 409
 
 if __name__ == '__main__':
-    # 開発環境でのみポート5000を使用
-    app.run(debug=True, port=5000)
+    if app.config['BASEBALL_ENV'] == 'production':
+        # 本番環境では gunicorn 等で複数ワーカーを起動する（README参照）。
+        # ここでは1ノード分をデバッグなしのスレッドサーバーで起動する
+        app.run(host=os.environ.get('HOST', '127.0.0.1'), port=int(os.environ.get('PORT', 5000)), threaded=True)
+    else:
+        # 開発環境でのみポート5000を使用
+        app.run(debug=True, port=5000)
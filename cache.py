@@ -0,0 +1,220 @@
+"""
+ユーザー情報・セーブデータ用のキャッシュバックエンド
+
+- LRUCache  : プロセス内LRU（デフォルト。単一プロセス運用向け）
+- RedisCache: Redisプロトコル(RESP)で話す共有キャッシュ（複数ワーカー・複数ノード向け）
+
+どちらも get / set / add / delete / clear の同じインターフェースを持つ。
+値はJSONで表現できるオブジェクト（dict, list など）に限る。
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+
+class LRUCache:
+    """スレッドセーフなプロセス内LRUキャッシュ（TTL付き）"""
+
+    def __init__(self, maxsize=1024, default_ttl=None):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data = OrderedDict() # key -> (期限, 値)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key) # 最近使ったものを末尾へ
+            return value
+
+    def set(self, key, value, ttl=None):
+        """値を保存する。保存できたかどうかを返す（RedisCache とインターフェースを揃える）"""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False) # 最も古いものを追い出す
+        return True
+
+    def add(self, key, value, ttl=None):
+        """キーがない場合だけ値を保存する。保存したかどうかを返す"""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] >= time.monotonic()):
+                return False
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """
+    Redisプロトコル(RESP)の最小クライアントによる共有キャッシュ。
+    外部ライブラリに依存しないため、本物のRedisでも tools/resp_server.py の代用サーバーでも動く。
+    キャッシュ障害時は例外を投げずにキャッシュミスとして扱い、DBにフォールバックさせる。
+    """
+
+    def __init__(self, url, default_ttl=300, timeout=2.0, prefix='baseball:'):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.default_ttl = default_ttl
+        self.timeout = timeout
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+        self._pid = None
+
+    # --- 接続管理 ---
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._file = sock.makefile('rb')
+        self._pid = os.getpid()
+        if self.password:
+            self._send_and_read('AUTH', self.password)
+        if self.db:
+            self._send_and_read('SELECT', self.db)
+
+    def _close(self):
+        for closable in (self._file, self._sock):
+            try:
+                if closable is not None:
+                    closable.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def _execute(self, *args):
+        """コマンドを実行する。fork後や切断時は1回だけ再接続して再試行する"""
+        with self._lock:
+            # fork後の子プロセスで親の接続を共有しない
+            if self._sock is not None and self._pid != os.getpid():
+                self._sock = None
+                self._file = None
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send_and_read(*args)
+                except (OSError, ConnectionError):
+                    self._close()
+                    if attempt == 1:
+                        raise
+
+    # --- RESP のエンコード/デコード ---
+
+    def _send_and_read(self, *args):
+        payload = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            payload.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._sock.sendall(b''.join(payload))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("connection closed by cache server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            raise RuntimeError(f"cache server error: {body.decode('utf-8')}")
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length == -1:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(body)
+            if count == -1:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f"unexpected reply from cache server: {line!r}")
+
+    # --- キャッシュ操作 ---
+
+    def get(self, key):
+        try:
+            data = self._execute('GET', self.prefix + key)
+        except (OSError, ConnectionError, RuntimeError):
+            return None
+        return json.loads(data) if data is not None else None
+
+    def _set_args(self, key, value, ttl):
+        ttl = self.default_ttl if ttl is None else ttl
+        args = ['SET', self.prefix + key, json.dumps(value)]
+        if ttl:
+            args += ['EX', int(ttl)]
+        return args
+
+    def set(self, key, value, ttl=None):
+        """値を保存する。失敗した場合は古い値が残らないようキーの削除を試み、False を返す"""
+        try:
+            self._execute(*self._set_args(key, value, ttl))
+            return True
+        except (OSError, ConnectionError, RuntimeError):
+            self.delete(key)
+            return False
+
+    def add(self, key, value, ttl=None):
+        """キーがない場合だけ値を保存する（SET NX）。保存したかどうかを返す"""
+        try:
+            return self._execute(*self._set_args(key, value, ttl), 'NX') is not None
+        except (OSError, ConnectionError, RuntimeError):
+            return False
+
+    def delete(self, key):
+        try:
+            self._execute('DEL', self.prefix + key)
+        except (OSError, ConnectionError, RuntimeError):
+            pass
+
+    def clear(self):
+        try:
+            self._execute('FLUSHDB')
+        except (OSError, ConnectionError, RuntimeError):
+            pass
+
+
+def create_cache(url=None, maxsize=1024, default_ttl=300):
+    """キャッシュURLからバックエンドを生成する（未指定・memory:// はプロセス内LRU）"""
+    if not url or url.startswith('memory://'):
+        return LRUCache(maxsize=maxsize, default_ttl=default_ttl)
+    if url.startswith('redis://'):
+        return RedisCache(url, default_ttl=default_ttl)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {url}")
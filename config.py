@@ -0,0 +1,75 @@
+"""
+実行モードごとの設定
+
+BASEBALL_ENV=development (デフォルト): 従来通りの単一プロセス構成（SQLite、固定シークレットキー）
+BASEBALL_ENV=production             : 複数ワーカー・複数ノード構成
+    SECRET_KEY   : 全ワーカー共通のセッション署名キー（必須）
+    DATABASE_URL : サーバー型DBのURL（必須。例: postgresql://user:pass@db:5432/baseball）
+    CACHE_URL    : ユーザー/セーブデータの共有キャッシュ（必須。例: redis://cache:6379/0）
+                   プロセス内LRU（memory://）はワーカー間で共有されないため使用できない
+    SESSION_COOKIE_SECURE : HTTPSでのみセッションクッキーを送る（デフォルト1。HTTPで試験する場合のみ0）
+"""
+import os
+
+DEV_SECRET_KEY = 'a_very_secret_key_for_session_management_baseball'
+
+
+def load_config(environ=os.environ):
+    """環境変数からFlaskの設定値を組み立てる"""
+    env = environ.get('BASEBALL_ENV', 'development')
+    if env not in ('development', 'production'):
+        raise RuntimeError(f"Unknown BASEBALL_ENV: {env}")
+
+    config = {
+        'BASEBALL_ENV': env,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'CACHE_URL': environ.get('CACHE_URL'),
+        'CACHE_MAXSIZE': int(environ.get('CACHE_MAXSIZE', 1024)),
+        'CACHE_TTL': int(environ.get('CACHE_TTL', 300)),
+    }
+
+    if env == 'development':
+        # 開発環境: 従来通りの設定
+        config['SECRET_KEY'] = environ.get('SECRET_KEY', DEV_SECRET_KEY)
+        config['SQLALCHEMY_DATABASE_URI'] = environ.get('DATABASE_URL', 'sqlite:///users.db')
+        return config
+
+    # 本番環境: セッションはクッキーに署名して保持するため、全ワーカーで同じキーが必要
+    secret_key = environ.get('SECRET_KEY')
+    if not secret_key:
+        raise RuntimeError("SECRET_KEY must be set when BASEBALL_ENV=production")
+
+    database_url = environ.get('DATABASE_URL')
+    if not database_url:
+        raise RuntimeError("DATABASE_URL must be set when BASEBALL_ENV=production")
+    # Heroku等の古い表記 postgres:// をSQLAlchemyの表記に揃える
+    if database_url.startswith('postgres://'):
+        database_url = 'postgresql://' + database_url[len('postgres://'):]
+    # SQLiteは複数ノードで共有できないため、明示的に許可された場合（負荷試験など）のみ使用する
+    if database_url.startswith('sqlite') and environ.get('ALLOW_SQLITE_IN_PRODUCTION') != '1':
+        raise RuntimeError("A server-grade DATABASE_URL (e.g. postgresql://) is required when BASEBALL_ENV=production")
+
+    # プロセス内LRUでは他のワーカーの書き込みが見えず、古いセーブデータを表示し続けてしまう
+    cache_url = environ.get('CACHE_URL')
+    if not cache_url or cache_url.startswith('memory://'):
+        raise RuntimeError("A shared CACHE_URL (e.g. redis://) is required when BASEBALL_ENV=production")
+
+    config.update({
+        'SECRET_KEY': secret_key,
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'SESSION_COOKIE_HTTPONLY': True,
+        'SESSION_COOKIE_SAMESITE': 'Lax',
+        'SESSION_COOKIE_SECURE': environ.get('SESSION_COOKIE_SECURE', '1') != '0',
+    })
+    if database_url.startswith('sqlite'):
+        # 複数プロセスからの同時書き込みでロック待ちになるため、待ち時間を長めに取る
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    else:
+        # ワーカーごとのコネクションプール
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        }
+    return config
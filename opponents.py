@@ -0,0 +1,106 @@
+"""
+対戦相手の事前準備
+
+セーブデータごとに、相手チームの打者プール・先発ローテーション・選手IDの辞書を
+一度だけ組み立ててキャッシュし、試合ごとのリクエストでは対戦する1チーム分を参照するだけにする。
+打順は従来通り試合ごとにランダムだが、事前に作った打者IDのプールから選ぶだけで済む。
+
+日程は相手チームを順番に回る総当たりで、何試合目かだけから決まる。
+各チームの先発は、そのチームとの対戦が一巡するごとにローテーションの次の投手になる。
+そのため日程やローテーションの進行状況を別途保存する必要はない。
+"""
+import json
+import random
+import zlib
+
+from cache import LRUCache
+
+
+def roster_version(teams_data, user_team_name):
+    """相手チームの選手構成と能力値から算出するバージョン（変わればキャッシュを作り直す）"""
+    opponents = {name: players for name, players in teams_data.items() if name != user_team_name}
+    signature = json.dumps(
+        {name: [(p['id'], p['is_pitcher'], p['abilities']) for p in players] for name, players in opponents.items()},
+        sort_keys=True,
+    )
+    return zlib.crc32(signature.encode('utf-8'))
+
+
+def _ability_total(player):
+    return sum(player['abilities'].values())
+
+
+class PreparedOpponent:
+    """1チーム分の事前計算済みデータ（試合ごとにTeamを組み立てるための材料）"""
+    def __init__(self, team_name, players):
+        self.name = team_name
+        self.players_map = {p['id']: p for p in players}
+        # 打者プール（選手ID）と、能力の高い順に並べた先発ローテーション（エースが1番手）
+        self.batter_pool = [p['id'] for p in players if not p['is_pitcher']]
+        self.rotation = sorted((p for p in players if p['is_pitcher']), key=_ability_total, reverse=True)
+
+    def random_lineup(self):
+        """打者プールからランダムに9人を選んだ打順"""
+        return random.sample(self.batter_pool, min(9, len(self.batter_pool)))
+
+    def starting_pitcher(self, turn):
+        """turn 回目の登板機会の先発投手"""
+        if not self.rotation:
+            return None
+        return self.rotation[turn % len(self.rotation)]
+
+
+class Matchup:
+    """1試合分の対戦カード"""
+    def __init__(self, game_number, opponent, pitcher):
+        self.game_number = game_number
+        self.opponent = opponent
+        self.pitcher = pitcher
+
+    def order(self):
+        """この試合の相手オーダー（打順は呼び出しごとにランダム）"""
+        return {
+            "batters": self.opponent.random_lineup(),
+            "pitcher": self.pitcher['id'] if self.pitcher else None,
+        }
+
+    def to_dict(self):
+        return {
+            "game_number": self.game_number,
+            "opponent": self.opponent.name,
+            "pitcher": self.pitcher['name'] if self.pitcher else None,
+        }
+
+
+class League:
+    """セーブデータ1つ分の相手チーム群と日程"""
+    def __init__(self, opponent_teams):
+        self.opponent_teams = opponent_teams
+        self.opponents = [PreparedOpponent(name, players) for name, players in opponent_teams.items()]
+        # teams_json を書き込むときに、相手チーム部分を毎回エンコードし直さずに済むようにする
+        self.opponents_json = json.dumps(opponent_teams)[1:-1]
+
+    def matchup(self, game_number):
+        """game_number 試合目（0始まり）の対戦カード"""
+        cycle, index = divmod(game_number, len(self.opponents))
+        opponent = self.opponents[index]
+        return Matchup(game_number, opponent, opponent.starting_pitcher(cycle))
+
+    def upcoming(self, game_number, count=5):
+        """game_number 試合目から count 試合分の日程"""
+        return [self.matchup(n).to_dict() for n in range(game_number, game_number + count)]
+
+
+class OpponentPreparer:
+    """(ユーザーID, 相手ロースターのバージョン) ごとに League をプロセス内にキャッシュする"""
+    def __init__(self, maxsize=256):
+        self._cache = LRUCache(maxsize=maxsize)
+
+    def get(self, user_id, version, load_opponent_teams):
+        """キャッシュにない場合だけ load_opponent_teams() で相手チームのデータを読み込む"""
+        key = f"{user_id}:{version}"
+        league = self._cache.get(key)
+        if league is None:
+            league = League(load_opponent_teams())
+            self._cache.set(key, league)
+        return league
@@ -2,6 +2,7 @@ let isAuthenticated = false;
 let gameState = {
     teams: null, // 全チームの選手リスト（能力と成績を含む）
     schedule: [], // ユーザーの試合履歴
+    upcoming: [], // 今後の対戦カード（相手チームと先発投手）
     current_order: { batters: [], pitcher: null } // ユーザーの保存済みオーダー
 };
 
@@ -176,6 +177,7 @@ const loadGameState = async () => {
         // グローバル状態を更新
         gameState.teams = data.teams;
         gameState.schedule = data.schedule;
+        gameState.upcoming = data.upcoming || [];
         gameState.current_order = data.current_order;
 
         isAuthenticated = true;
@@ -285,9 +287,46 @@ const renderOrderPage = () => {
 // 日程進行画面 (ID: schedule-page)
 // --------------------------------------------------
 
+/**
+ * 直近の試合の勝利確率グラフ（SVG）と勝負所の打席を描画する
+ * @param {object|undefined} result - 試合結果（win_probability と key_plays を含む）
+ */
+const renderWinProbability = (result) => {
+    const chart = document.getElementById('wp-chart');
+    const keyPlays = document.getElementById('key-plays');
+    if (!chart || !keyPlays) return;
+
+    chart.innerHTML = '';
+    keyPlays.innerHTML = '';
+    if (!result || !result.win_probability || result.win_probability.length === 0) {
+        chart.textContent = '勝利確率のデータはまだありません。';
+        return;
+    }
+
+    // 横軸: 打席, 縦軸: 自チームの勝利確率 (上が100%)
+    const series = result.win_probability;
+    const width = 300, height = 100;
+    const step = series.length > 1 ? width / (series.length - 1) : width;
+    const points = series.map((wp, i) => `${(i * step).toFixed(1)},${((1 - wp) * height).toFixed(1)}`).join(' ');
+    chart.innerHTML = `
+        <svg viewBox="0 0 ${width} ${height}" preserveAspectRatio="none">
+            <line x1="0" y1="${height / 2}" x2="${width}" y2="${height / 2}" stroke="#adb5bd" stroke-dasharray="4" />
+            <polyline points="${points}" fill="none" stroke="#007bff" stroke-width="2" vector-effect="non-scaling-stroke" />
+        </svg>`;
+
+    (result.key_plays || []).forEach(play => {
+        const li = document.createElement('li');
+        const half = play.half === 'top' ? '表' : '裏';
+        const wpa = (play.wpa * 100).toFixed(1);
+        li.textContent = `${play.inning}回${half} ${play.description} (勝利確率 ${wpa > 0 ? '+' : ''}${wpa}%, レバレッジ ${play.leverage.toFixed(2)})`;
+        keyPlays.appendChild(li);
+    });
+};
+
 const renderSchedulePage = () => {
     const scheduleDisplay = document.getElementById('game-schedule');
     const rankingDisplay = document.getElementById('league-ranking');
+    const upcomingDisplay = document.getElementById('upcoming-schedule');
     
     // 試合履歴の表示
     scheduleDisplay.innerHTML = '<h3>試合結果</h3>';
@@ -306,6 +345,19 @@ const renderSchedulePage = () => {
         scheduleDisplay.innerHTML += '<li>まだ試合がありません。</li>';
     }
 
+    // 直近の試合の勝利確率
+    renderWinProbability(gameState.schedule[gameState.schedule.length - 1]);
+
+    // 今後の対戦カードの表示
+    if (upcomingDisplay) {
+        upcomingDisplay.innerHTML = '';
+        gameState.upcoming.forEach(matchup => {
+            const li = document.createElement('li');
+            li.textContent = `第${matchup.game_number + 1}試合 vs ${matchup.opponent} (予告先発: ${matchup.pitcher || '未定'})`;
+            upcomingDisplay.appendChild(li);
+        });
+    }
+
     rankingDisplay.innerHTML = '<h3>リーグ順位</h3><li>順位データは後で実装します。</li>';
 };
 
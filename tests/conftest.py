@@ -0,0 +1,26 @@
+"""テスト共通: 開発モードの app を一時ディレクトリのSQLiteファイルで読み込めるようにする"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix='baseball_test_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+
+os.environ['BASEBALL_ENV'] = 'development'
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.pop('CACHE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def client():
+    """testuser でログイン済みのテストクライアント"""
+    from app import app
+    client = app.test_client()
+    response = client.post('/login', json={"username": "testuser", "password": "password"})
+    assert response.status_code == 200
+    return client
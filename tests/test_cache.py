@@ -0,0 +1,86 @@
+"""キャッシュバックエンドの確認（RedisCache は tools/resp_server.py の代用サーバーに接続する）"""
+import socket
+import time
+
+import pytest
+
+from cache import LRUCache, RedisCache, create_cache
+from tools.resp_server import start_background_server
+
+
+@pytest.fixture(scope='module')
+def resp_port():
+    server, port = start_background_server()
+    yield port
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def redis_cache(resp_port):
+    cache = RedisCache(f'redis://127.0.0.1:{resp_port}/0')
+    cache.clear()
+    return cache
+
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_redis_round_trip(redis_cache):
+    value = {"user_team": [{"name": "田中 健太", "abilities": {"meet": 80}}], "version": 3}
+    assert redis_cache.set('user_state:1', value)
+    assert redis_cache.get('user_state:1') == value
+    redis_cache.delete('user_state:1')
+    assert redis_cache.get('user_state:1') is None
+
+
+def test_redis_ttl(redis_cache):
+    redis_cache.set('short', [1], ttl=1)
+    assert redis_cache.get('short') == [1]
+    time.sleep(1.1)
+    assert redis_cache.get('short') is None
+
+
+def test_redis_add_keeps_existing_value(redis_cache):
+    assert redis_cache.add('user_state:1', {"version": 2})
+    assert not redis_cache.add('user_state:1', {"version": 1})
+    assert redis_cache.get('user_state:1') == {"version": 2}
+
+
+def test_redis_falls_back_to_miss_when_server_is_down():
+    cache = RedisCache(f'redis://127.0.0.1:{closed_port()}/0', timeout=0.5)
+    assert cache.get('user:1') is None
+    assert cache.set('user:1', {"id": 1}) is False
+    assert cache.add('user:1', {"id": 1}) is False
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a') # a を最近使ったものにする
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_lru_ttl_and_add():
+    cache = LRUCache(default_ttl=0.05)
+    cache.set('a', 1)
+    assert not cache.add('a', 2)
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert cache.add('a', 2)
+    assert cache.get('a') == 2
+
+
+def test_create_cache():
+    assert isinstance(create_cache(None), LRUCache)
+    assert isinstance(create_cache('memory://'), LRUCache)
+    assert isinstance(create_cache('redis://127.0.0.1:6379/0'), RedisCache)
+    with pytest.raises(ValueError):
+        create_cache('memcached://127.0.0.1')
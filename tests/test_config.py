@@ -0,0 +1,44 @@
+"""本番モードの設定チェックの確認"""
+import pytest
+
+from config import DEV_SECRET_KEY, load_config
+
+PRODUCTION = {
+    'BASEBALL_ENV': 'production',
+    'SECRET_KEY': 'secret',
+    'DATABASE_URL': 'postgresql://user:pass@db:5432/baseball',
+    'CACHE_URL': 'redis://cache:6379/0',
+}
+
+
+def test_development_defaults():
+    config = load_config({})
+    assert config['SECRET_KEY'] == DEV_SECRET_KEY
+    assert config['SQLALCHEMY_DATABASE_URI'] == 'sqlite:///users.db'
+
+
+def test_production():
+    config = load_config(PRODUCTION)
+    assert config['SQLALCHEMY_DATABASE_URI'] == PRODUCTION['DATABASE_URL']
+    assert config['SESSION_COOKIE_SECURE'] is True
+    assert load_config({**PRODUCTION, 'SESSION_COOKIE_SECURE': '0'})['SESSION_COOKIE_SECURE'] is False
+
+
+@pytest.mark.parametrize('name', ['SECRET_KEY', 'DATABASE_URL', 'CACHE_URL'])
+def test_production_requires(name):
+    environ = {key: value for key, value in PRODUCTION.items() if key != name}
+    with pytest.raises(RuntimeError, match=name):
+        load_config(environ)
+
+
+def test_production_rejects_sqlite():
+    environ = {**PRODUCTION, 'DATABASE_URL': 'sqlite:///users.db'}
+    with pytest.raises(RuntimeError):
+        load_config(environ)
+    config = load_config({**environ, 'ALLOW_SQLITE_IN_PRODUCTION': '1'})
+    assert config['SQLALCHEMY_ENGINE_OPTIONS'] == {'connect_args': {'timeout': 30}}
+
+
+def test_production_rejects_memory_cache():
+    with pytest.raises(RuntimeError, match='CACHE_URL'):
+        load_config({**PRODUCTION, 'CACHE_URL': 'memory://'})
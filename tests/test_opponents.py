@@ -0,0 +1,72 @@
+"""対戦相手の事前準備（総当たり日程・先発ローテーション・バージョンごとのキャッシュ）の確認"""
+import pytest
+
+from app import USER_TEAM_NAME, generate_initial_teams_data
+from opponents import League, OpponentPreparer, roster_version
+
+
+@pytest.fixture(scope='module')
+def teams_data():
+    return generate_initial_teams_data()
+
+
+@pytest.fixture
+def league(teams_data):
+    return League({name: players for name, players in teams_data.items() if name != USER_TEAM_NAME})
+
+
+def test_round_robin(league):
+    assert len(league.opponents) == 5
+    for n in range(20):
+        assert league.matchup(n).opponent is league.opponents[n % 5]
+
+
+def test_rotation_advances_once_per_cycle(league):
+    for opponent_index, opponent in enumerate(league.opponents):
+        starters = [league.matchup(cycle * 5 + opponent_index).pitcher for cycle in range(len(opponent.rotation) + 1)]
+        # 1巡ごとに次の投手になり、ローテーションを一周したらエースに戻る
+        assert starters[:-1] == opponent.rotation
+        assert starters[-1] is opponent.rotation[0]
+
+
+def test_upcoming_matches_matchup(league):
+    upcoming = league.upcoming(7, count=5)
+    assert [game['game_number'] for game in upcoming] == list(range(7, 12))
+    for game in upcoming:
+        matchup = league.matchup(game['game_number'])
+        assert game['opponent'] == matchup.opponent.name
+        assert game['pitcher'] == matchup.pitcher['name']
+
+
+def test_random_lineup(league):
+    opponent = league.opponents[0]
+    lineup = opponent.random_lineup()
+    assert len(lineup) == len(set(lineup)) == 9
+    assert set(lineup) <= set(opponent.batter_pool)
+
+
+def test_preparer_rebuilds_league_for_new_roster_version(teams_data):
+    preparer = OpponentPreparer()
+    loads = []
+
+    def load_opponent_teams():
+        loads.append(1)
+        return {name: players for name, players in teams_data.items() if name != USER_TEAM_NAME}
+
+    version = roster_version(teams_data, USER_TEAM_NAME)
+    first = preparer.get(1, version, load_opponent_teams)
+    assert preparer.get(1, version, load_opponent_teams) is first
+    assert len(loads) == 1
+
+    rebuilt = preparer.get(1, version + 1, load_opponent_teams)
+    assert rebuilt is not first
+    assert len(loads) == 2
+
+
+def test_roster_version_ignores_user_team(teams_data):
+    version = roster_version(teams_data, USER_TEAM_NAME)
+    changed_user_team = {**teams_data, USER_TEAM_NAME: []}
+    assert roster_version(changed_user_team, USER_TEAM_NAME) == version
+    opponent_name = next(name for name in teams_data if name != USER_TEAM_NAME)
+    changed_opponent = {**teams_data, opponent_name: teams_data[opponent_name][1:]}
+    assert roster_version(changed_opponent, USER_TEAM_NAME) != version
@@ -0,0 +1,41 @@
+"""セーブデータの書き込み競合（version 列）の確認"""
+import pytest
+
+import app as app_module
+from app import User, app, cache, load_user_state, save_user_state, user_state_cache_key
+
+
+@pytest.fixture
+def user_id():
+    with app.app_context():
+        return User.query.filter_by(username='testuser').first().id
+
+
+def test_stale_version_is_not_saved(user_id):
+    with app.app_context():
+        stale = load_user_state(user_id, create=True)
+        assert save_user_state(user_id, stale, {"current_order_json": '{"batters": [], "pitcher": null}'},
+                               current_order={"batters": [], "pitcher": None})
+        # 古い version のまま書き込もうとしても何も書かれず、キャッシュにも残らない
+        assert not save_user_state(user_id, stale, {"current_order_json": '{"batters": [1], "pitcher": null}'},
+                                   current_order={"batters": [1], "pitcher": None})
+        assert cache.get(user_state_cache_key(user_id)) is None
+        current = load_user_state(user_id, refresh=True)
+        assert current['version'] == stale['version'] + 1
+        assert current['current_order'] == {"batters": [], "pitcher": None}
+
+
+def test_order_conflict_returns_409(client, monkeypatch):
+    load = app_module.load_user_state
+    calls = []
+
+    def load_stale(user_id, **kwargs):
+        # 読み込むたびに他のワーカーが先に書き込んだ状況を再現する
+        calls.append(kwargs)
+        state = load(user_id, **kwargs)
+        return {**state, "version": state['version'] - 1}
+
+    monkeypatch.setattr(app_module, 'load_user_state', load_stale)
+    response = client.post('/api/order', json={"batters": [], "pitcher": None})
+    assert response.status_code == 409
+    assert len(calls) == app_module.SAVE_RETRIES
@@ -0,0 +1,55 @@
+"""勝利確率の記録（チェンジ時・試合終了時の添字の遷移と、試合結果への反映）の確認"""
+from app import USER_TEAM_NAME, GameEngine, GameState, Team, generate_initial_teams_data
+from win_expectancy import final_win_probability, load_default, situation_index
+
+
+def make_engine():
+    teams_data = generate_initial_teams_data()
+    teams = []
+    for name in list(teams_data)[:2]:
+        players = teams_data[name]
+        order = {"batters": [p['id'] for p in players if not p['is_pitcher']][:9],
+                 "pitcher": next(p['id'] for p in players if p['is_pitcher'])}
+        teams.append(Team(name, players, order))
+    return GameEngine(GameState(*teams), load_default())
+
+
+def test_index_at_half_inning_end():
+    engine = make_engine()
+    state = engine.state
+    state.inning, state.outs = 3, 2
+    state.bases, state.base_state = [None, 'runner', None], 2
+    assert engine.current_situation() == situation_index(3, 0, 2, 2, 0)
+
+    # 3アウト目の打席後はチェンジ後（3回裏、無死走者なし）の添字になり、チェンジしても変わらない
+    state.outs = 3
+    after = engine.current_situation()
+    assert after == situation_index(3, 1, 0, 0, 0)
+    state.switch_half()
+    assert engine.current_situation() == after
+
+
+def test_index_at_game_end():
+    engine = make_engine()
+    engine.run_game()
+    plays = engine.plays
+    # 各打席の「打席前」は直前の打席の「打席後」と一致し、最後の打席の後は試合終了で添字がない
+    assert all(prev[1] == play[0] for prev, play in zip(plays, plays[1:]))
+    assert plays[-1][1] is None
+    assert engine.win_probability_series()[-1] == final_win_probability(engine.score_diff())
+    assert len(engine.play_details()) == len(plays)
+
+
+def test_simulate_game_returns_plays_only_on_request(client):
+    players = client.get('/api/game_state').get_json()['teams'][USER_TEAM_NAME]
+    order = {"batters": [p['id'] for p in players if not p['is_pitcher']][:9],
+             "pitcher": next(p['id'] for p in players if p['is_pitcher'])}
+    assert client.post('/api/order', json=order).status_code == 200
+
+    assert 'plays' not in client.get('/api/simulate_game').get_json()
+    plays = client.get('/api/simulate_game?details=1').get_json()['plays']
+    assert plays and {'wp_before', 'wp_after', 'wpa', 'leverage'} <= set(plays[0])
+    # 試合履歴には勝利確率の推移と勝負所の打席が残る
+    game = client.get('/api/game_state').get_json()['schedule'][-1]
+    assert len(game['win_probability']) == len(plays) + 1
+    assert len(game['key_plays']) == 5
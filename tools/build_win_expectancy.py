@@ -0,0 +1,160 @@
+"""
+勝利確率・レバレッジのテーブルを既存の GameEngine の大量シミュレーションで作成する
+
+1回目: 各打席前の状況ごとに、最終的に先攻チームが勝ったか（引き分けは0.5）を集計して勝利確率を求める
+2回目: 1回目のテーブルを使って試合を回し、状況ごとの打席による勝利確率の変動幅からレバレッジを求める
+
+サンプルの少ない状況は、同じイニング・表裏・得点差の平均（さらに得点差だけの平均）に寄せて補正する。
+
+    python -m tools.build_win_expectancy --games 200000 --leverage-games 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+# テーブル作成にDBは不要なので、インメモリDBで app を読み込む
+os.environ['BASEBALL_ENV'] = 'development'
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.pop('CACHE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import GameEngine, GameState, Team, generate_initial_teams_data  # noqa: E402
+from win_expectancy import (  # noqa: E402
+    DEFAULT_PATH, DIFFS, HALVES, INNINGS, LEVERAGE_SCALE, MAX_DIFF, TABLE_SIZE, WP_SCALE,
+    WinExpectancy, final_win_probability, inning_and_half,
+)
+
+SHRINK = 20 # サンプル数がこの程度になるまでは粗い集計の値に寄せる
+
+
+class SituationRecordingEngine(GameEngine):
+    """打席前の状況の添字だけを記録するエンジン（1回目用）"""
+    def __init__(self, game_state):
+        super().__init__(game_state)
+        # テーブルがなくても打席前の状況は記録する
+        self.record_plays = True
+        self.situation = self.current_situation()
+        self.situations = []
+
+    def record_play(self, batter, result_type, runs):
+        self.situations.append(self.situation)
+        self.situation = self.current_situation()
+
+
+class SwingRecordingEngine(GameEngine):
+    """打席ごとの勝利確率の変動幅を状況の添字と一緒に記録するエンジン（2回目用）"""
+    def __init__(self, game_state, win_expectancy):
+        super().__init__(game_state, win_expectancy)
+        self.swings = []
+
+    def record_play(self, batter, result_type, runs):
+        super().record_play(batter, result_type, runs)
+        wp_before, wp_after = self.play_win_probabilities(self.plays[-1])
+        self.swings.append((self.plays[-1][0], abs(wp_after - wp_before)))
+
+
+def random_matchups(games, league_every):
+    """能力値の異なるリーグを定期的に作り直しながら、ランダムな対戦カードを生成する"""
+    teams_data = None
+    for game in range(games):
+        if game % league_every == 0:
+            teams_data = generate_initial_teams_data()
+        first, second = random.sample(list(teams_data), 2)
+        yield random_team(first, teams_data[first]), random_team(second, teams_data[second])
+
+
+def random_team(team_name, players):
+    batters = [p['id'] for p in players if not p['is_pitcher']]
+    pitchers = [p['id'] for p in players if p['is_pitcher']]
+    return Team(team_name, players, {"batters": random.sample(batters, 9), "pitcher": random.choice(pitchers)})
+
+
+def coarse_keys(index):
+    """添字から (イニング, 表裏, 得点差) と 得点差 の集計キーを求める"""
+    diff_slot = index % DIFFS
+    inning, half = inning_and_half(index)
+    return ((inning - 1) * HALVES + half) * DIFFS + diff_slot, diff_slot
+
+
+def shrink(total, count, prior):
+    return (total + SHRINK * prior) / (count + SHRINK)
+
+
+def smoothed(totals, counts, fallback):
+    """状況ごとの平均を、粗い集計の平均に寄せて補正する"""
+    mid_totals, mid_counts = [0.0] * (INNINGS * HALVES * DIFFS), [0] * (INNINGS * HALVES * DIFFS)
+    diff_totals, diff_counts = [0.0] * DIFFS, [0] * DIFFS
+    for index in range(TABLE_SIZE):
+        mid, diff_slot = coarse_keys(index)
+        mid_totals[mid] += totals[index]
+        mid_counts[mid] += counts[index]
+        diff_totals[diff_slot] += totals[index]
+        diff_counts[diff_slot] += counts[index]
+
+    values = []
+    for index in range(TABLE_SIZE):
+        mid, diff_slot = coarse_keys(index)
+        diff_value = shrink(diff_totals[diff_slot], diff_counts[diff_slot], fallback(diff_slot - MAX_DIFF))
+        mid_value = shrink(mid_totals[mid], mid_counts[mid], diff_value)
+        values.append(shrink(totals[index], counts[index], mid_value))
+    return values
+
+
+def build_win_probability(games, league_every):
+    totals, counts = [0.0] * TABLE_SIZE, [0] * TABLE_SIZE
+    for first, second in random_matchups(games, league_every):
+        engine = SituationRecordingEngine(GameState(first, second))
+        engine.run_game()
+        outcome = final_win_probability(engine.score_diff())
+        for index in engine.situations:
+            totals[index] += outcome
+            counts[index] += 1
+    # 得点差だけの集計もない場合は、リードしている側を少し有利とみなす
+    values = smoothed(totals, counts, lambda diff: 0.5 + 0.05 * diff)
+    return array('H', (round(max(0.0, min(1.0, v)) * WP_SCALE) for v in values)), sum(counts)
+
+
+def build_leverage(wp, games, league_every):
+    provisional = WinExpectancy(wp, array('H', [LEVERAGE_SCALE] * TABLE_SIZE))
+    totals, counts = [0.0] * TABLE_SIZE, [0] * TABLE_SIZE
+    for first, second in random_matchups(games, league_every):
+        engine = SwingRecordingEngine(GameState(first, second), provisional)
+        engine.run_game()
+        for index, swing in engine.swings:
+            totals[index] += swing
+            counts[index] += 1
+    mean_swing = sum(totals) / max(1, sum(counts))
+    values = smoothed(totals, counts, lambda diff: mean_swing)
+    return array('H', (min(65535, round(v / mean_swing * LEVERAGE_SCALE)) for v in values)), mean_swing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the win expectancy / leverage table by simulation")
+    parser.add_argument('--games', type=int, default=200000, help="games for the win probability pass")
+    parser.add_argument('--leverage-games', type=int, default=100000, help="games for the leverage pass")
+    parser.add_argument('--league-every', type=int, default=500, help="regenerate random rosters every N games")
+    parser.add_argument('--seed', type=int, default=20240601)
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    started = time.monotonic()
+    wp, plate_appearances = build_win_probability(args.games, args.league_every)
+    print(f"win probability: {args.games} games, {plate_appearances} plate appearances "
+          f"({time.monotonic() - started:.0f}s)")
+
+    started = time.monotonic()
+    leverage, mean_swing = build_leverage(wp, args.leverage_games, args.league_every)
+    print(f"leverage: {args.leverage_games} games, mean |WPA| per plate appearance {mean_swing:.4f} "
+          f"({time.monotonic() - started:.0f}s)")
+
+    table = WinExpectancy(wp, leverage)
+    table.save(args.output)
+    print(f"saved {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""
+HTTPの一連の操作を多数の仮想監督で再現する負荷生成ツール（asyncio）
+
+ローカルに本番モードのサーバー（gunicorn）を起動し、各仮想ユーザーが以下を実行する。
+    1. /login でログイン
+    2. /api/game_state で状態を取得
+    3. ランダムな有効オーダーを /api/order で保存
+    4. /api/simulate_game を繰り返す（--game-state-every 回ごとに /api/game_state も取得）
+
+エンドポイントごとの p50/p95/p99 レイテンシとエラー率、DBサイズの推移を表示し、
+--output でJSONに保存する。--baseline に前回のJSONを渡すとp95とスループットの差分を表示する。
+- レイテンシの分布は成功したリクエストだけで求める（タイムアウト等の失敗は別に集計する）
+- スループットは全ユーザーの投入が終わった後（ramp 以降）に完了した成功リクエストから求めるため、
+  --ramp の異なる実行同士でも比較できる
+
+    python -m tools.loadgen --users 50 --ramp 10 --duration 60 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime
+
+from tools.local_server import PASSWORD, REPO_ROOT, USER_TEAM_NAME, LocalEnvironment, stop_server
+
+
+class HttpError(Exception):
+    pass
+
+
+async def http_request(port, method, path, body=None, cookie=None, timeout=30.0):
+    """1回のHTTP/1.1リクエスト（Connection: close）。(ステータス, ヘッダー, 本文) を返す"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        lines = [f'{method} {path} HTTP/1.1', f'Host: 127.0.0.1:{port}', 'Connection: close',
+                 f'Content-Length: {len(payload)}']
+        if body is not None:
+            lines.append('Content-Type: application/json')
+        if cookie:
+            lines.append(f'Cookie: {cookie}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+        await writer.drain()
+
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+
+    head, _, data = raw.partition(b'\r\n\r\n')
+    if not head:
+        raise HttpError("empty response")
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in header_lines:
+        name, _, value = line.partition(':')
+        headers.setdefault(name.strip().lower(), value.strip())
+    return int(status_line.split()[1]), headers, data
+
+
+class Recorder:
+    """
+    エンドポイントごとのレイテンシとエラーを記録する。
+    latencies は成功したリクエストだけ、失敗したリクエストのレイテンシは error_latencies に分けて持つ。
+    measure_from（time.monotonic の時刻）以降に完了した成功リクエストをスループットの計算に使う。
+    """
+
+    def __init__(self, measure_from=None):
+        self.measure_from = measure_from
+        self.latencies = {}
+        self.error_latencies = {}
+        self.measured = {}
+        self.error_samples = {}
+
+    async def call(self, name, port, method, path, body=None, cookie=None):
+        started = time.perf_counter()
+        try:
+            status, headers, data = await http_request(port, method, path, body, cookie)
+        except (OSError, asyncio.TimeoutError, HttpError) as e:
+            status, headers, data = None, {}, str(e).encode('utf-8')
+        latency = time.perf_counter() - started
+        if status != 200:
+            self.error_latencies.setdefault(name, []).append(latency)
+            self.error_samples.setdefault(name, f"{status}: {data[:200].decode('utf-8', 'replace')}")
+            return None
+        self.latencies.setdefault(name, []).append(latency)
+        if self.measure_from is None or time.monotonic() >= self.measure_from:
+            self.measured[name] = self.measured.get(name, 0) + 1
+        return headers, data
+
+    @property
+    def errors(self):
+        return {name: len(latencies) for name, latencies in self.error_latencies.items()}
+
+    def summary(self, measured_sec):
+        """measured_sec: スループットの計算に使う時間（measure_from から終了まで）"""
+        endpoints = {}
+        for name in sorted(set(self.latencies) | set(self.error_latencies)):
+            latencies = sorted(self.latencies.get(name, []))
+            error_latencies = self.error_latencies.get(name, [])
+            requests = len(latencies) + len(error_latencies)
+            endpoints[name] = {
+                "requests": requests,
+                "errors": len(error_latencies),
+                "error_rate": round(len(error_latencies) / requests, 4),
+                "throughput_rps": round(self.measured.get(name, 0) / measured_sec, 2) if measured_sec > 0 else 0.0,
+                "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            }
+            if error_latencies:
+                endpoints[name]["error_mean_ms"] = round(sum(error_latencies) / len(error_latencies) * 1000, 2)
+                endpoints[name]["error_max_ms"] = round(max(error_latencies) * 1000, 2)
+                endpoints[name]["error_sample"] = self.error_samples[name]
+        return endpoints
+
+
+def percentile(sorted_values, pct):
+    """最近傍順位法によるパーセンタイル（sorted_values は昇順）"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def random_order(teams):
+    """ユーザーチームからランダムな有効オーダー（野手9人と先発投手）を作る"""
+    players = teams[USER_TEAM_NAME]
+    batters = [p['id'] for p in players if not p['is_pitcher']]
+    pitchers = [p['id'] for p in players if p['is_pitcher']]
+    return {"batters": random.sample(batters, 9), "pitcher": random.choice(pitchers)}
+
+
+async def virtual_user(username, port, recorder, start_delay, deadline, options):
+    """1人分の仮想監督"""
+    await asyncio.sleep(start_delay)
+
+    result = await recorder.call('/login', port, 'POST', '/login', {"username": username, "password": PASSWORD})
+    if result is None:
+        return
+    cookie = result[0].get('set-cookie', '').split(';', 1)[0]
+
+    result = await recorder.call('/api/game_state', port, 'GET', '/api/game_state', cookie=cookie)
+    if result is None:
+        return
+    order = random_order(json.loads(result[1])['teams'])
+    if await recorder.call('/api/order', port, 'POST', '/api/order', order, cookie=cookie) is None:
+        return
+
+    games = 0
+    while time.monotonic() < deadline:
+        await recorder.call('/api/simulate_game', port, 'GET', '/api/simulate_game', cookie=cookie)
+        games += 1
+        if options.game_state_every and games % options.game_state_every == 0:
+            await recorder.call('/api/game_state', port, 'GET', '/api/game_state', cookie=cookie)
+        if options.think_ms:
+            await asyncio.sleep(random.uniform(0, 2 * options.think_ms) / 1000)
+
+
+async def sample_db_size(local, started, deadline, interval, samples):
+    """DBサイズを一定間隔で記録する"""
+    while True:
+        size = await asyncio.to_thread(local.db_size_bytes)
+        samples.append({"t_sec": round(time.monotonic() - started, 1), "bytes": size})
+        if time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(min(interval, max(0.0, deadline - time.monotonic())))
+
+
+async def run(local, usernames, port, options):
+    started = time.monotonic()
+    ramp_end = started + options.ramp
+    deadline = ramp_end + options.duration
+    # 投入中はユーザー数が少なくスループットが低く出るため、ramp 以降だけを計測する
+    recorder = Recorder(measure_from=ramp_end)
+    db_samples = []
+
+    # ramp 秒かけて仮想ユーザーを均等に投入する
+    step = options.ramp / len(usernames) if usernames else 0
+    users = [virtual_user(name, port, recorder, i * step, deadline, options) for i, name in enumerate(usernames)]
+    sampler = asyncio.create_task(sample_db_size(local, started, deadline, options.sample_interval, db_samples))
+    await asyncio.gather(*users)
+    await sampler
+    finished = time.monotonic()
+    return recorder.summary(finished - ramp_end), db_samples, finished - started, finished - ramp_end
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"{'endpoint':<22}{'reqs':>8}{'err%':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for name, stats in report['endpoints'].items():
+        print(f"{name:<22}{stats['requests']:>8}{stats['error_rate'] * 100:>7.2f}%{stats['throughput_rps']:>9.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+    print(f"(rps: successful requests after the {report['config']['ramp_sec']:g}s ramp, "
+          f"over {report['measured_sec']:.1f}s; latencies: successful requests only)")
+    for name, stats in report['endpoints'].items():
+        if stats['errors']:
+            print(f"{name:<22}{stats['errors']} failed: mean {stats['error_mean_ms']:.1f} ms, "
+                  f"max {stats['error_max_ms']:.1f} ms ({stats['error_sample']})")
+    sizes = [s['bytes'] for s in report['db_size'] if s['bytes'] is not None]
+    if sizes:
+        growth = sizes[-1] - sizes[0]
+        print(f"DB size: {sizes[0] / 1024:.0f} KiB -> {sizes[-1] / 1024:.0f} KiB "
+              f"(+{growth / 1024:.0f} KiB, {growth / 1024 / report['elapsed_sec']:.1f} KiB/s)")
+
+    if baseline:
+        print(f"\nvs baseline ({baseline.get('revision')}):")
+        if baseline.get('throughput_basis') != report['throughput_basis']:
+            print("  note: the baseline measured rps including the ramp (and latencies including failures); "
+                  "rps and p95 are not directly comparable")
+        for name, stats in report['endpoints'].items():
+            old = baseline.get('endpoints', {}).get(name)
+            if not old:
+                continue
+            print(f"{name:<22}p95 {old['p95_ms']:>8.1f} -> {stats['p95_ms']:>8.1f} ms   "
+                  f"rps {old['throughput_rps']:>7.1f} -> {stats['throughput_rps']:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator driving the full HTTP flow with virtual managers")
+    parser.add_argument('--users', type=int, default=20, help="number of virtual managers (concurrency)")
+    parser.add_argument('--ramp', type=float, default=5.0, help="seconds to start all users")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds to keep running after the ramp")
+    parser.add_argument('--think-ms', type=float, default=0.0, help="mean think time between games")
+    parser.add_argument('--game-state-every', type=int, default=5,
+                        help="reload /api/game_state every N games (0 to disable)")
+    parser.add_argument('--workers', type=int, default=1, help="number of gunicorn worker processes")
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--database-url', help="DB URL for the server (default: temporary SQLite file)")
+    parser.add_argument('--cache-url', help="shared cache URL (default: bundled RESP stand-in)")
+    parser.add_argument('--sample-interval', type=float, default=1.0, help="seconds between DB size samples")
+    parser.add_argument('--seed', type=int, help="random seed for orders and think time")
+    parser.add_argument('--output', help="write machine-readable results to this JSON file")
+    parser.add_argument('--baseline', help="previous results JSON to compare against")
+    options = parser.parse_args()
+    if options.seed is not None:
+        random.seed(options.seed)
+
+    local = LocalEnvironment(options.database_url, options.cache_url)
+    try:
+        usernames = local.seed_users(options.users)
+        server = local.start_server(options.workers, options.port)
+        try:
+            endpoints, db_samples, elapsed, measured = asyncio.run(run(local, usernames, options.port, options))
+        finally:
+            stop_server(server)
+    finally:
+        local.close()
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "users": options.users, "ramp_sec": options.ramp, "duration_sec": options.duration,
+            "think_ms": options.think_ms, "game_state_every": options.game_state_every,
+            "workers": options.workers, "database_url": local.database_url, "cache_url": local.cache_url,
+        },
+        "elapsed_sec": round(elapsed, 2),
+        "measured_sec": round(measured, 2),
+        "throughput_basis": "after_ramp",
+        "endpoints": endpoints,
+        "db_size": db_samples,
+    }
+
+    baseline = None
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
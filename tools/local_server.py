@@ -0,0 +1,168 @@
+"""
+負荷試験ツール共通: 本番モードのサーバー（gunicorn）をローカルに起動し、試験用ユーザーを用意する
+
+DATABASE_URL を指定しない場合は一時ディレクトリのSQLiteファイル（ALLOW_SQLITE_IN_PRODUCTION=1）、
+CACHE_URL を指定しない場合は tools/resp_server.py の代用サーバーを別プロセスで起動して使う。
+"""
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_TEAM_NAME = "自チーム (blue)"
+PASSWORD = 'loadtest-password'
+
+
+class LocalEnvironment:
+    """試験用のDB・キャッシュ・環境変数一式"""
+
+    def __init__(self, database_url=None, cache_url=None, prefix='baseball_load_'):
+        self.workdir = tempfile.mkdtemp(prefix=prefix)
+        self.resp_server = None
+        if cache_url is None:
+            # 計測側のプロセスとGILを共有しないよう、代用サーバーは別プロセスで動かす
+            resp_port = free_port()
+            self.resp_server = subprocess.Popen(
+                [sys.executable, '-m', 'tools.resp_server', '--port', str(resp_port)], cwd=REPO_ROOT,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            _wait_until(lambda: _is_listening(resp_port), f"RESP stand-in on port {resp_port} did not start")
+            cache_url = f'redis://127.0.0.1:{resp_port}/0'
+        self.database_url = database_url or f"sqlite:///{os.path.join(self.workdir, 'load.db')}"
+        self.cache_url = cache_url
+
+        self.env = dict(os.environ,
+                        BASEBALL_ENV='production',
+                        SECRET_KEY=os.environ.get('SECRET_KEY', 'load-test-secret'),
+                        DATABASE_URL=self.database_url,
+                        CACHE_URL=cache_url,
+                        # ローカルの試験サーバーはHTTPで接続するため
+                        SESSION_COOKIE_SECURE='0')
+        if database_url is None:
+            self.env['ALLOW_SQLITE_IN_PRODUCTION'] = '1'
+        self._app_module = None
+
+    @property
+    def app_module(self):
+        """親プロセスで app をインポートする（スキーマ作成・ユーザー作成・DBサイズ計測用）"""
+        if self._app_module is None:
+            os.environ.update(self.env)
+            sys.path.insert(0, REPO_ROOT)
+            import app as app_module
+            self._app_module = app_module
+        return self._app_module
+
+    def seed_users(self, count, prefix='load_user'):
+        """試験用ユーザーを作成し、オーダーを設定して試合履歴を空にする。ユーザー名のリストを返す"""
+        app_module = self.app_module
+        app, db = app_module.app, app_module.db
+        usernames = [f'{prefix}_{i}' for i in range(count)]
+        with app.app_context():
+            for username in usernames:
+                user = app_module.User.query.filter_by(username=username).first()
+                if user is None:
+                    user = app_module.User(username=username)
+                    user.set_password(PASSWORD)
+                    db.session.add(user)
+                    db.session.commit()
+                    db.session.add(app_module.UserState.create_initial_state(user.id))
+                    db.session.commit()
+                user_state = app_module.UserState.query.filter_by(user_id=user.id).first()
+                players = json.loads(user_state.teams_json)[USER_TEAM_NAME]
+                order = {
+                    "batters": [p['id'] for p in players if not p['is_pitcher']][:9],
+                    "pitcher": next(p['id'] for p in players if p['is_pitcher']),
+                }
+                user_state.current_order_json = json.dumps(order)
+                user_state.schedule_json = json.dumps([])
+                user_state.version += 1
+                db.session.commit()
+                # 試合履歴をリセットしたので共有キャッシュ上の古いセーブデータも消す
+                app_module.cache.delete(app_module.user_state_cache_key(user.id))
+            db.engine.dispose()
+        return usernames
+
+    def db_size_bytes(self):
+        """DBの使用サイズ（SQLiteはファイルサイズ、PostgreSQLは pg_database_size）。計測できなければ None"""
+        if self.database_url.startswith('sqlite:///'):
+            path = self.database_url[len('sqlite:///'):]
+            return sum(os.path.getsize(p) for p in (path, path + '-wal', path + '-journal') if os.path.exists(p))
+        if self.database_url.startswith('postgresql'):
+            app_module = self.app_module
+            with app_module.app.app_context():
+                return app_module.db.session.execute(
+                    app_module.db.text('SELECT pg_database_size(current_database())')).scalar()
+        return None
+
+    def start_server(self, workers, port):
+        """gunicorn で app を workers プロセス起動し、応答するまで待つ（README の本番構成と同じ起動方法）"""
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--preload',
+             '--bind', f'127.0.0.1:{port}', '--backlog', '2048', 'app:app'],
+            cwd=REPO_ROOT, env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until(lambda: server.poll() is None and _is_ready(port), f"gunicorn on port {port} did not start")
+        except RuntimeError:
+            stop_server(server)
+            raise
+        return server
+
+    def close(self):
+        if self.resp_server is not None:
+            stop_server(self.resp_server)
+            self.resp_server = None
+        # 一時ディレクトリのSQLiteファイルを残さない
+        if self._app_module is not None:
+            with self._app_module.app.app_context():
+                self._app_module.db.engine.dispose()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def stop_server(server):
+    """サーバープロセスを停止する（gunicorn はSIGTERMでワーカーごと終了する）"""
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until(predicate, message, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise RuntimeError(message)
+        time.sleep(0.1)
+
+
+def _is_listening(port):
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def _is_ready(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+    try:
+        conn.request('GET', '/')
+        return conn.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        conn.close()
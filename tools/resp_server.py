@@ -0,0 +1,148 @@
+"""
+Redisプロトコル(RESP)を話す最小のインメモリサーバー（テスト・負荷試験用の代用品）
+
+本物のRedisが用意できない環境で CACHE_URL=redis://127.0.0.1:<port>/0 の動作確認に使う。
+対応コマンド: PING, GET, SET (EX/PX/NX), DEL, EXISTS, DBSIZE, FLUSHDB, SELECT, AUTH
+
+    python -m tools.resp_server --port 6380
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class RespStore:
+    """有効期限付きのキーバリューストア"""
+
+    def __init__(self):
+        self._data = {} # key -> (期限, 値)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+
+    def delete(self, keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def size(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """1接続ごとにコマンドを読み、応答を返す"""
+
+    def handle(self):
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.dispatch(args))
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # インラインコマンド（telnet等）
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            header = self.rfile.readline()
+            if not header.startswith(b'$'):
+                raise ValueError("bulk string expected")
+            args.append(self.rfile.read(int(header[1:-2]) + 2)[:-2])
+        return args
+
+    def dispatch(self, args):
+        store = self.server.store
+        command = args[0].upper()
+        if command == b'PING':
+            return b'+PONG\r\n'
+        if command in (b'SELECT', b'AUTH'):
+            return b'+OK\r\n'
+        if command == b'GET':
+            value = store.get(args[1])
+            if value is None:
+                return b'$-1\r\n'
+            return b'$%d\r\n%s\r\n' % (len(value), value)
+        if command == b'SET':
+            ttl = None
+            options = [a.upper() for a in args[3:]]
+            if b'EX' in options:
+                ttl = int(args[3 + options.index(b'EX') + 1])
+            elif b'PX' in options:
+                ttl = int(args[3 + options.index(b'PX') + 1]) / 1000
+            if b'NX' in options and store.get(args[1]) is not None:
+                return b'$-1\r\n'
+            store.set(args[1], args[2], ttl)
+            return b'+OK\r\n'
+        if command == b'DEL':
+            return b':%d\r\n' % store.delete(args[1:])
+        if command == b'EXISTS':
+            return b':%d\r\n' % sum(1 for key in args[1:] if store.get(key) is not None)
+        if command == b'DBSIZE':
+            return b':%d\r\n' % store.size()
+        if command in (b'FLUSHDB', b'FLUSHALL'):
+            store.clear()
+            return b'+OK\r\n'
+        return b'-ERR unknown command\r\n'
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, RespHandler)
+        self.store = RespStore()
+
+
+def start_background_server(host='127.0.0.1', port=0):
+    """別スレッドでサーバーを起動し、(server, port) を返す（port=0 なら空きポート）"""
+    server = RespServer((host, port))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, server.server_address[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimal Redis-protocol stand-in server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6380)
+    args = parser.parse_args()
+
+    server = RespServer((args.host, args.port))
+    print(f"RESP stand-in listening on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
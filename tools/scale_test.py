@@ -0,0 +1,153 @@
+"""
+複数ワーカー構成の負荷試験（ワーカー数に対するスループットのスケーリング確認）
+
+BASEBALL_ENV=production の app を gunicorn で N ワーカー起動し（README の本番構成と同じ）、
+共有DB・共有キャッシュ（別プロセスで動く tools/resp_server.py のRedis互換サーバー）の上で、
+ログイン→試合進行→状態取得を繰り返す。
+負荷は複数のクライアントプロセス（それぞれ asyncio）から送るため、計測側がボトルネックになりにくい。
+gunicorn はワーカー間で接続を振り分けるので、どのワーカーでもセッションとキャッシュが
+共有されていることも同時に確認できる。
+
+    python -m tools.scale_test --workers 1,2,4 --database-url postgresql://user:pass@db:5432/baseball
+
+スケーリングを確認するには --database-url でサーバー型DB（PostgreSQL等）を指定し、
+ワーカー数とクライアントプロセスの合計より多いCPUコアを持つマシンで実行する。
+- DBを指定しない場合は一時的なSQLiteファイルで代用する（ALLOW_SQLITE_IN_PRODUCTION=1）が、
+  試合ごとの書き込みがファイルロック待ちで直列化されるため、ワーカー数を増やしてもスループットは伸びない
+- サーバーとクライアントが同じマシンのCPUを取り合うため、スケーリングの上限はCPUコア数で決まる
+どちらの場合も警告を表示し、結果のJSONにも記録する。
+サーバー（gunicorn 全体）が消費したCPU時間も記録するので、1リクエストあたりのCPU時間から
+コア数に対する処理能力の上限を見積もれる。
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from tools.loadgen import Recorder, percentile
+from tools.local_server import PASSWORD, LocalEnvironment, stop_server
+
+
+async def _virtual_user(username, port, deadline, recorder):
+    """ログイン後、試合進行と状態取得を繰り返す"""
+    result = await recorder.call('login', port, 'POST', '/login', {"username": username, "password": PASSWORD})
+    if result is None:
+        return
+    cookie = result[0].get('set-cookie', '').split(';', 1)[0]
+    while time.time() < deadline:
+        await recorder.call('simulate_game', port, 'GET', '/api/simulate_game', cookie=cookie)
+        await recorder.call('game_state', port, 'GET', '/api/game_state', cookie=cookie)
+
+
+def _client_process(usernames, port, deadline):
+    """クライアントプロセス1つ分。担当ユーザーを asyncio で並行に動かし、計測結果を返す"""
+    recorder = Recorder()
+
+    async def run_users():
+        await asyncio.gather(*(_virtual_user(name, port, deadline, recorder) for name in usernames))
+
+    asyncio.run(run_users())
+    # ログインは計測対象から外す
+    latencies = recorder.latencies.get('simulate_game', []) + recorder.latencies.get('game_state', [])
+    errors = sum(count for name, count in recorder.errors.items() if name != 'login')
+    return latencies, errors, recorder.errors.get('login', 0)
+
+
+def run_load(usernames, port, duration, clients):
+    """usernames を clients 個のプロセスに分けて負荷をかける"""
+    groups = [usernames[i::clients] for i in range(clients)]
+    started = time.time()
+    deadline = started + duration
+    with multiprocessing.get_context('spawn').Pool(clients) as pool:
+        results = pool.starmap(_client_process, [(group, port, deadline) for group in groups if group])
+    elapsed = time.time() - started
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    login_errors = sum(result[2] for result in results)
+    completed = len(latencies) # latencies は成功したリクエストだけ
+    return {
+        "requests": completed,
+        "errors": errors + login_errors,
+        "elapsed_sec": round(elapsed, 2),
+        "throughput_rps": round(completed / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+    }
+
+
+def _children_cpu_seconds():
+    """回収済みの子孫プロセスが使ったCPU時間の合計（gunicorn のワーカーはマスター経由で加算される）"""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def scaling_warnings(database_url, max_workers, clients):
+    """この構成ではスケーリングを確認できない理由（なければ空リスト）"""
+    warnings = []
+    if database_url is None or database_url.startswith('sqlite'):
+        warnings.append("falling back to a SQLite file: every /api/simulate_game waits for its file lock, "
+                        "so throughput cannot scale with workers. Pass --database-url postgresql://...")
+    cpus = os.cpu_count() or 1
+    if cpus < max_workers + clients:
+        warnings.append(f"{cpus} CPU(s) for up to {max_workers} workers + {clients} client processes: "
+                        "server and clients compete for the same cores, so the speedup is capped by the CPU count")
+    return warnings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-worker throughput test for production mode")
+    parser.add_argument('--workers', default='1,2,4', help="comma separated gunicorn worker counts (default: 1,2,4)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per worker count")
+    parser.add_argument('--concurrency', type=int, default=32, help="virtual users (one account each)")
+    parser.add_argument('--clients', type=int, default=4, help="load generating processes")
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--database-url', help="server-grade DB URL (default: temporary SQLite file)")
+    parser.add_argument('--cache-url', help="shared cache URL (default: bundled RESP stand-in process)")
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+    worker_counts = [int(n) for n in args.workers.split(',')]
+    warnings = scaling_warnings(args.database_url, max(worker_counts), args.clients)
+    for warning in warnings:
+        print(f"WARNING: {warning}", file=sys.stderr)
+
+    local = LocalEnvironment(args.database_url, args.cache_url, prefix='baseball_scale_')
+    report = []
+    try:
+        for workers in worker_counts:
+            usernames = local.seed_users(args.concurrency, prefix='scale_user')
+            server = local.start_server(workers, args.port)
+            try:
+                result = run_load(usernames, args.port, args.duration, args.clients)
+                # クライアントプロセスは run_load 内で回収済みなので、ここからの差分は gunicorn の分だけになる
+                cpu_before = _children_cpu_seconds()
+            finally:
+                stop_server(server)
+            server_cpu = _children_cpu_seconds() - cpu_before
+            result['workers'] = workers
+            result['server_cpu_sec'] = round(server_cpu, 2)
+            result['server_cpu_ms_per_request'] = round(server_cpu * 1000 / max(result['requests'], 1), 2)
+            report.append(result)
+            print(f"workers={workers:>2}  {result['throughput_rps']:>8.1f} req/s  p50={result['p50_ms']:>7.1f} ms  "
+                  f"p95={result['p95_ms']:>7.1f} ms  requests={result['requests']}  errors={result['errors']}  "
+                  f"server CPU={result['server_cpu_ms_per_request']:.2f} ms/req")
+    finally:
+        local.close()
+
+    baseline = report[0]['throughput_rps'] or 1.0
+    for result in report:
+        result['speedup'] = round(result['throughput_rps'] / baseline, 2)
+    print(f"speedup vs first run ({os.cpu_count()} CPUs): "
+          + ", ".join(f"{r['workers']}w={r['speedup']}x" for r in report))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"cpus": os.cpu_count(), "database_url": local.database_url, "cache_url": local.cache_url,
+                       "warnings": warnings, "results": report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
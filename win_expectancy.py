@@ -0,0 +1,100 @@
+"""
+勝利確率（Win Expectancy）とレバレッジのテーブル
+
+試合状況（イニング・表裏・アウト数・走者状況・得点差）ごとの先攻チームの勝利確率と
+レバレッジ指数を、tools/build_win_expectancy.py で既存の GameEngine を大量に回して事前計算し、
+data/win_expectancy.bin に uint16 の配列として保存する。
+実行時は起動時に一度だけ読み込み、打席ごとには配列を引くだけにする。
+
+- 勝利確率: 先攻チームの 勝利 + 0.5 × 引き分け の確率
+- 得点差  : 先攻 − 後攻（±10点で打ち切り）
+- 走者状況: 1塁=1, 2塁=2, 3塁=4 のビットの和（0〜7）
+- レバレッジ: その状況での打席による勝利確率の変動幅の期待値 ÷ 全打席の平均（平均的な場面が1.0）
+"""
+import os
+import sys
+from array import array
+
+INNINGS = 9
+HALVES = 2 # 0: 表, 1: 裏
+OUTS = 3
+BASE_STATES = 8
+MAX_DIFF = 10
+DIFFS = 2 * MAX_DIFF + 1
+TABLE_SIZE = INNINGS * HALVES * OUTS * BASE_STATES * DIFFS
+
+WP_SCALE = 10000 # 勝利確率は 0〜10000 で保持
+LEVERAGE_SCALE = 1000 # レバレッジは 1.0 = 1000 で保持
+MAGIC = b'WEX1'
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'win_expectancy.bin')
+
+
+def situation_index(inning, half, outs, bases, diff):
+    """試合状況をテーブルの添字に変換する（half は 0: 表, 1: 裏）"""
+    # 打席ごとに呼ばれるため、max/min の呼び出しを避けて比較で打ち切る
+    if diff > MAX_DIFF:
+        diff = MAX_DIFF
+    elif diff < -MAX_DIFF:
+        diff = -MAX_DIFF
+    return ((((inning - 1) * HALVES + half) * OUTS + outs) * BASE_STATES + bases) * DIFFS + diff + MAX_DIFF
+
+
+def inning_and_half(index):
+    """添字からイニングと表裏（0: 表, 1: 裏）を求める"""
+    inning_half = index // (OUTS * BASE_STATES * DIFFS)
+    return inning_half // HALVES + 1, inning_half % HALVES
+
+
+def final_win_probability(diff):
+    """試合終了時の先攻チームの勝利確率"""
+    return 1.0 if diff > 0 else 0.0 if diff < 0 else 0.5
+
+
+class WinExpectancy:
+    """勝利確率とレバレッジのテーブル"""
+
+    def __init__(self, wp, leverage):
+        if len(wp) != TABLE_SIZE or len(leverage) != TABLE_SIZE:
+            raise ValueError("win expectancy table has an unexpected size")
+        self.wp = wp
+        self.leverage_table = leverage
+
+    def win_probability(self, index):
+        return self.wp[index] / WP_SCALE
+
+    def leverage(self, index):
+        return self.leverage_table[index] / LEVERAGE_SCALE
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a win expectancy table")
+            wp = array('H')
+            wp.fromfile(f, TABLE_SIZE)
+            leverage = array('H')
+            leverage.fromfile(f, TABLE_SIZE)
+        if sys.byteorder != 'little':
+            wp.byteswap()
+            leverage.byteswap()
+        return cls(wp, leverage)
+
+    def save(self, path=DEFAULT_PATH):
+        wp, leverage = array('H', self.wp), array('H', self.leverage_table)
+        if sys.byteorder != 'little':
+            wp.byteswap()
+            leverage.byteswap()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            wp.tofile(f)
+            leverage.tofile(f)
+
+
+def load_default():
+    """同梱のテーブルを読み込む。見つからない場合は None（勝利確率の付与を行わない）"""
+    try:
+        return WinExpectancy.load(DEFAULT_PATH)
+    except (OSError, ValueError, EOFError):
+        return None